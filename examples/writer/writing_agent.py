@@ -6,50 +6,417 @@
 具有写作风格记忆、写作工具和协作功能。
 
 使用方法:
-1. 确保 Letta 服务器正在运行: `letta server`
-2. 运行此脚本: `python writing_agent.py`
+1. 自托管：确保 Letta 服务器正在运行: `letta server`
+   Letta Cloud：设置环境变量 LETTA_API_KEY
+2. 运行此脚本: `python writing_agent.py [--backend local|cloud]`
+   （未指定时，设置了 LETTA_API_KEY 则使用 cloud，否则使用 local）
 """
 
+import argparse
 import asyncio
+import functools
+import hashlib
+import io
 import json
 import os
+import re
+import string
+import sys
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Literal, Optional
 
-from letta_client import CreateBlock, Letta, MessageCreate
+import httpx
+import numpy as np
+from letta_client import AsyncLetta, CreateBlock, MessageCreate
+from letta_client.core.api_error import ApiError
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时退回标准库 json
+    orjson = None
+
+# Letta Cloud 地址
+LETTA_CLOUD_URL = "https://api.letta.com"
+
+# 各部署方式使用的模型和嵌入模型
+BACKEND_MODELS = {
+    "cloud": ("openai/gpt-4o-mini", "openai/text-embedding-3-small"),
+    "local": ("deepseek/deepseek-chat", "ollama/nomic-embed-text:latest")
+}
+
+# 本地响应缓存文件
+CACHE_PATH = ".letta_cache.json"
+
+# 串行化同一进程内对缓存文件的“读取-合并-替换”
+_CACHE_FILE_LOCK = threading.Lock()
+
+# 记录已创建智能体 ID 的目录（按服务器地址分子目录），下次运行时可直接按 ID 取回
+AGENT_REGISTRY_DIR = os.path.expanduser("~/.letta/agents")
+
+# 同时进行的 LLM 请求上限（所有智能体共享），避免触发服务商的速率限制
+MAX_CONCURRENT_REQUESTS = 8
+
+# asyncio 的同步原语绑定首次争用时的事件循环，因此按事件循环分别创建（循环结束后随之回收），
+# 多次 asyncio.run 之间不会共用
+_REQUEST_SEMAPHORES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+# Letta 智能体是有状态的：服务器在每一步结束时写回“开始时的消息列表 + 本步新消息”，
+# 同一智能体上的并发请求会互相覆盖消息历史，因此每个智能体的请求必须串行。
+# 锁只在有请求持有或等待时存在，不会随智能体数量累积
+_AGENT_LOCKS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, weakref.WeakValueDictionary]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _request_semaphore() -> asyncio.Semaphore:
+    """当前事件循环的全局请求信号量"""
+    loop = asyncio.get_running_loop()
+    semaphore = _REQUEST_SEMAPHORES.get(loop)
+    if semaphore is None:
+        semaphore = _REQUEST_SEMAPHORES[loop] = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    return semaphore
+
+
+def _agent_lock(agent_id: str) -> asyncio.Lock:
+    """当前事件循环中指定智能体的请求锁"""
+    locks = _AGENT_LOCKS.setdefault(asyncio.get_running_loop(), weakref.WeakValueDictionary())
+    lock = locks.get(agent_id)
+    if lock is None:
+        lock = locks[agent_id] = asyncio.Lock()
+    return lock
+
+# 润色、风格调整结果的记录在内存中保留的最大条数
+MAX_MEMO_ENTRIES = 256
+
+# 智能体记忆块的初始内容（只在首次创建智能体时使用）
+_PERSONA_TMPL = string.Template("""你是一个专业的写作助手，具有以下特点：
+1. 写作风格：$style
+2. 擅长各种文体：学术论文、商业报告、创意写作、技术文档等
+3. 注重逻辑性、清晰度和可读性
+4. 能够根据读者群体调整写作风格
+5. 具备研究和分析能力，能够提供有深度的内容""")
+
+# 从 persona 记忆块中取回写作风格（与 _PERSONA_TMPL 的第 1 条对应）
+_PERSONA_STYLE_PATTERN = re.compile(r"^1\. 写作风格：(.+)$", re.MULTILINE)
+
+_WRITING_SKILLS = """核心写作技能：
+- 结构化写作：能够组织清晰的文章结构
+- 语言表达：使用准确、生动的语言
+- 逻辑推理：构建有力的论证
+- 读者导向：根据目标读者调整内容
+- 创意表达：在保持专业性的同时展现创意"""
+
+# 各方法提示词中固定不变的指令部分。放在提示词开头并保持逐字节一致，
+# 使服务端的前缀缓存可以复用，每次只需处理后面变化的参数部分。
+_OUTLINE_PREAMBLE = """请为下方给出的主题生成详细的写作大纲。
+
+请提供：
+1. 文章标题建议
+2. 主要章节结构
+3. 每个章节的关键要点
+4. 逻辑流程说明
+5. 建议的写作顺序
+
+请确保大纲逻辑清晰，结构合理。
+"""
+
+_EXPAND_PREAMBLE = """请将下方给出的各个章节内容分别扩展为完整的段落。
+
+要求：
+1. 每个章节的字数控制在该章节的目标字数左右
+2. 保持逻辑清晰，过渡自然
+3. 使用具体的例子和细节
+4. 确保内容有深度和说服力
+5. 语言流畅，符合目标读者需求
+
+请依次扩展每个章节，将第 i 个章节扩展后的内容放在 <<<SECTION i>>> 与 <<<END i>>> 之间返回，不需要额外说明。
+"""
+
+_POLISH_PREAMBLE = """请对下方给出的内容进行润色改进。
+
+润色要求：
+1. 改进语言表达，使其更加生动有力
+2. 优化句子结构，提高可读性
+3. 增强逻辑性和连贯性
+4. 确保用词准确，避免重复
+5. 保持原文的核心观点和结构
+
+请直接输出润色后的内容，并简要说明主要改进点。
+"""
+
+_STYLE_PREAMBLE = """请将下方给出的内容调整为指定的写作风格。
+
+风格调整要求：
+1. 语言风格：符合下方指定的目标风格
+2. 保持原文的核心信息和逻辑结构
+3. 调整语调和表达方式以符合目标风格
+4. 确保风格转换自然，不显突兀
+5. 保持内容的专业性和准确性
+
+请直接输出调整后的内容。
+"""
+
+_RESEARCH_PREAMBLE = """请对下方给出的主题进行 {depth_desc} 的研究。
+
+请提供：
+1. 主题的核心概念和定义
+2. 相关的重要事实和数据
+3. 不同观点和争议点
+4. 实际应用和案例
+5. 进一步研究的建议
+
+研究要求：{depth_desc}，确保信息的准确性和相关性。
+"""
+
+_RESEARCH_DEPTHS = {
+    "shallow": "提供基础信息和概述",
+    "medium": "提供详细信息和多个角度",
+    "deep": "提供深入分析和专业见解"
+}
+
+# 提示词模板在加载时构建一次，调用时只替换变化的参数
+_OUTLINE_TMPL = string.Template(_OUTLINE_PREAMBLE + "\n主题：$topic\n结构类型：$structure_type\n")
+
+_SECTION_TMPL = string.Template("\n第 $index 个章节：$section\n关键要点：\n$points\n目标字数：$word_count\n")
+
+_POLISH_TMPL = string.Template(_POLISH_PREAMBLE + "$focus\n\n待润色内容：\n$content\n")
+
+_STYLE_TMPL = string.Template(_STYLE_PREAMBLE + "\n目标风格：$target_style\n\n待调整内容：\n$content\n")
+
+# 按研究深度预先生成完整的提示词模板，调用时只需填入主题
+_RESEARCH_PROMPTS = {
+    depth: string.Template(_RESEARCH_PREAMBLE.replace("{depth_desc}", desc) + "\n主题：$topic\n")
+    for depth, desc in _RESEARCH_DEPTHS.items()
+}
+
+# 单次请求批量扩展的章节数上限，避免超出模型上下文
+MAX_SECTIONS_PER_BATCH = 8
+
+_SECTION_PATTERN = re.compile(r"<<<SECTION (\d+)>>>(.*?)<<<END \1>>>", re.S)
+
+
+def _parse_sections(response: str) -> Dict[int, str]:
+    """按分隔标记拆分批量扩展的回复，返回 {章节序号: 内容}"""
+    return {int(i): text.strip() for i, text in _SECTION_PATTERN.findall(response)}
+
+
+class _ResponseCache:
+    """
+    LLM 响应缓存
+
+    两级查找：先按参数的 SHA-256 精确匹配，未命中时（若提供了 embed 函数）
+    再在同一范围（方法、模型、离散参数等）内按可变部分向量的余弦相似度匹配历史响应。
+    提示词的固定前言不参与向量化，否则相似度主要由共同的前言决定。
+    """
+
+    def __init__(self, path: Optional[str] = CACHE_PATH,
+                 embed: Optional[Callable[[str], List[float]]] = None, threshold: float = 0.95):
+        """
+        Args:
+            path: 持久化文件路径，为 None 时仅缓存在内存中
+            embed: 文本向量化函数，为 None 时关闭语义匹配
+            threshold: 语义匹配的余弦相似度阈值
+        """
+        self.path = path
+        self.embed = embed
+        self.threshold = threshold
+        self._exact: Dict[str, str] = {}
+        self._semantic: Dict[str, Dict[str, list]] = {}
+        self._pending: Dict[str, List[float]] = {}
+        self._load()
+
+    @staticmethod
+    def make_key(**params) -> str:
+        """将参数规范化为 JSON 后计算 SHA-256 作为缓存键"""
+        blob = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str, scope: str, query: str) -> Optional[str]:
+        """
+        查找缓存，未命中返回 None
+        
+        Args:
+            key: 精确匹配的缓存键
+            scope: 语义匹配的范围，只与同一范围内的历史响应比较
+            query: 提示词中随调用变化的部分，语义匹配只比较这一部分
+        """
+        if key in self._exact:
+            return self._exact[key]
+        if self.embed is None:
+            return None
+
+        # embed 通常是同步的模型或网络调用，放到线程中执行以免阻塞事件循环
+        vec = np.asarray(await asyncio.to_thread(self.embed, query), dtype=float)
+        entries = self._semantic.get(scope)
+        if entries:
+            matrix = np.asarray(entries["vectors"], dtype=float)
+            scores = matrix @ vec / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(vec) + 1e-12)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                return entries["responses"][best]
+                
+        # 未命中时暂存向量供随后的 put 使用；调用方不写入缓存时须调用 discard 释放
+        self._pending[key] = vec.tolist()
+        return None
+
+    def discard(self, key: str) -> None:
+        """释放 get 未命中时暂存的向量（回复不写入缓存时调用）"""
+        self._pending.pop(key, None)
+
+    async def put(self, key: str, scope: str, query: str, response: str) -> None:
+        """写入缓存并持久化（文件写入在线程中进行，不阻塞事件循环）"""
+        self._exact[key] = response
+        if self.embed is not None:
+            vec = self._pending.pop(key, None) or list(await asyncio.to_thread(self.embed, query))
+            entries = self._semantic.setdefault(scope, {"vectors": [], "responses": []})
+            entries["vectors"].append(vec)
+            entries["responses"].append(response)
+        else:
+            vec = None
+        if self.path:
+            await asyncio.to_thread(self._save, key, scope, vec, response)
+
+    def _load(self) -> None:
+        if not self.path:
+            return
+        data = self._read(self.path)
+        self._exact = data.get("exact", {})
+        self._semantic = data.get("semantic", {})
+
+    @staticmethod
+    def _read(path: str) -> dict:
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取缓存失败: {e}")
+            return {}
+
+    def _save(self, key: str, scope: str, vec: Optional[List[float]], response: str) -> None:
+        """
+        将新条目合并进磁盘上的最新内容后整体替换
+        
+        先重新读取文件，保留其他进程（或 ultimate_simple.py）写入的条目；
+        写入临时文件后再 os.replace，中途崩溃不会留下损坏的缓存文件。
+        """
+        with _CACHE_FILE_LOCK:
+            data = self._read(self.path)
+            data.setdefault("exact", {})[key] = response
+            if vec is not None:
+                entries = data.setdefault("semantic", {}).setdefault(scope, {"vectors": [], "responses": []})
+                entries["vectors"].append(vec)
+                entries["responses"].append(response)
+                
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"写入缓存失败: {e}")
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+
+def _requires_agent(method):
+    """装饰需要先创建智能体的方法；以 python -O 运行时省略该检查"""
+    if sys.flags.optimize:
+        return method
+        
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if self.agent is None:
+            raise ValueError("请先创建写作智能体")
+        return await method(self, *args, **kwargs)
+    return wrapper
 
 
 class WritingAgent:
     """基于 Letta 的写作智能体类"""
     
-    def __init__(self, base_url: str = "http://localhost:8283", token: Optional[str] = None):
+    __slots__ = (
+        "client", "agent", "writing_style", "current_project", "model", "embedding",
+        "_http", "_base_url", "_cache", "_project_info", "_pending_writes",
+        "_polish_cache", "_style_cache"
+    )
+    
+    def __init__(self, base_url: str = "http://localhost:8283", token: Optional[str] = None,
+                 backend: Optional[Literal["cloud", "local"]] = None,
+                 cache_path: Optional[str] = CACHE_PATH,
+                 embed: Optional[Callable[[str], List[float]]] = None):
         """
         初始化写作智能体
         
         Args:
             base_url: Letta 服务器地址
             token: API 密钥（如果使用 Letta Cloud）
+            backend: 部署方式，决定使用的模型；由是否提供 token 决定，显式指定时必须与之一致
+            cache_path: 响应缓存文件路径，为 None 时不持久化
+            embed: 文本向量化函数，提供后启用语义缓存
+            
+        Raises:
+            ValueError: backend 与 token 不匹配（cloud 需要 token，local 不能提供 token）
         """
+        expected = "cloud" if token else "local"
+        if backend and backend != expected:
+            raise ValueError(f"backend={backend!r} 与 token 不匹配：cloud 需要提供 token，local 不能提供 token")
+        self.model, self.embedding = BACKEND_MODELS[expected]
+        
+        # 所有请求复用同一个连接池，避免每次调用都重新进行 TCP/TLS 握手
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60),
+            timeout=httpx.Timeout(120.0)
+        )
         if token:
-            self.client = Letta(token=token)
-            self.model="openai/gpt-4o-mini"
-            self.embedding="openai/text-embedding-3-small"
+            self._base_url = LETTA_CLOUD_URL
+            self.client = AsyncLetta(token=token, httpx_client=self._http)
         else:
-            self.client = Letta(base_url=base_url)
-            self.model="deepseek/deepseek-chat"
-            self.embedding="ollama/nomic-embed-text:latest"
+            self._base_url = base_url
+            self.client = AsyncLetta(base_url=base_url, httpx_client=self._http)
         
         self.agent = None
         self.writing_style = "专业、清晰、有逻辑性"
         self.current_project = None
+        self._project_info = None
+        self._pending_writes: List[asyncio.Task] = []
+        self._polish_cache: OrderedDict = OrderedDict()
+        self._style_cache: OrderedDict = OrderedDict()
+        self._cache = _ResponseCache(path=cache_path, embed=embed)
+    
+    async def _warm_up(self) -> None:
+        """预先建立连接，使后续请求无需再握手"""
+        try:
+            await self._http.get(f"{self._base_url}/v1/health/")
+        except httpx.HTTPError as e:
+            print(f"预热连接失败: {e}")
+    
+    async def flush(self) -> None:
+        """等待所有后台记忆块写入完成"""
+        await asyncio.gather(*self._pending_writes, return_exceptions=True)
+    
+    async def aclose(self) -> None:
+        """关闭 HTTP 连接池"""
+        await self._http.aclose()
         
-    async def create_writing_agent(self, name: str = "写作助手", style: str = None) -> str:
+    async def create_writing_agent(self, name: str = "写作助手", style: str = None,
+                                   force_new: bool = False) -> str:
         """
-        创建写作智能体
+        创建写作智能体，已存在同名智能体时直接复用
         
         Args:
             name: 智能体名称
             style: 写作风格描述
+            force_new: 为 True 时忽略已有智能体，总是重新创建
             
         Returns:
             智能体 ID
@@ -57,34 +424,37 @@ class WritingAgent:
         if style:
             self.writing_style = style
             
+        await self._warm_up()
+        if not force_new:
+            existing = await self._find_agent(name)
+            if existing:
+                self.agent = existing
+                print(f"✅ 复用已有写作智能体 '{name}'")
+                print(f"智能体 ID: {self.agent.id}")
+                await self._sync_reused_agent(style)
+                return self.agent.id
+            
         # 创建写作智能体的记忆块
         memory_blocks = [
             CreateBlock(
                 label="persona",
-                value=f"""你是一个专业的写作助手，具有以下特点：
-1. 写作风格：{self.writing_style}
-2. 擅长各种文体：学术论文、商业报告、创意写作、技术文档等
-3. 注重逻辑性、清晰度和可读性
-4. 能够根据读者群体调整写作风格
-5. 具备研究和分析能力，能够提供有深度的内容"""
+                description="本块存储有关当前agent角色的详细信息,指导agent的行为和响应方式。助于和用户在互动中保持一致性.",
+                value=_PERSONA_TMPL.substitute(style=self.writing_style)
             ),
             CreateBlock(
                 label="writing_skills",
-                value="""核心写作技能：
-- 结构化写作：能够组织清晰的文章结构
-- 语言表达：使用准确、生动的语言
-- 逻辑推理：构建有力的论证
-- 读者导向：根据目标读者调整内容
-- 创意表达：在保持专业性的同时展现创意"""
+                description="本块存储写作写作技巧相关知识 ，帮助智能体提升写作质量。",
+                value=_WRITING_SKILLS
             ),
             CreateBlock(
                 label="current_project",
+                description="本块存储当前的写作项目详情，帮助智能体跟踪进度和要求。",
                 value="写作项目"
             )
         ]
         
         # 创建智能体
-        self.agent = self.client.agents.create(
+        self.agent = await self.client.agents.create(
             name=name,
             memory_blocks=memory_blocks,
             model=self.model,
@@ -94,8 +464,70 @@ class WritingAgent:
         
         print(f"✅ 写作智能体 '{name}' 创建成功！")
         print(f"智能体 ID: {self.agent.id}")
+        self._save_agent_id(name, self.agent.id)
         return self.agent.id
     
+    async def _sync_reused_agent(self, style: Optional[str]) -> None:
+        """使本地设置与复用的智能体一致：模型以智能体为准，写作风格以参数为准，未指定时以智能体为准"""
+        llm_handle = self.agent.llm_config.handle
+        if llm_handle and llm_handle != self.model:
+            print(f"⚠️ 复用的智能体使用模型 {llm_handle}，与当前配置 {self.model} 不同，以智能体为准")
+            self.model = llm_handle
+        if self.agent.embedding_config.handle:
+            self.embedding = self.agent.embedding_config.handle
+            
+        current = next((b.value for b in self.agent.memory.blocks if b.label == "persona"), None)
+        if style:
+            persona = _PERSONA_TMPL.substitute(style=self.writing_style)
+            if current != persona:
+                await self._update_memory_block("persona", persona)
+        elif current:
+            # 未指定风格时沿用智能体记忆中的风格，使缓存范围与智能体实际使用的风格一致；
+            # 记忆块已被改写、无法解析时，以整段 persona 区分
+            match = _PERSONA_STYLE_PATTERN.search(current)
+            self.writing_style = match.group(1).strip() if match else current
+    
+    async def _find_agent(self, name: str):
+        """查找已有的同名智能体，优先使用本地记录的 ID，找不到时返回 None"""
+        agent_id = self._load_agent_id(name)
+        if agent_id:
+            try:
+                return await self.client.agents.retrieve(agent_id)
+            except ApiError as e:
+                # 记录已失效（智能体已被删除），退回按名称查找
+                if e.status_code != 404:
+                    raise
+                
+        agents = await self.client.agents.list(name=name, limit=1)
+        if not agents:
+            return None
+        self._save_agent_id(name, agents[0].id)
+        return agents[0]
+    
+    def _registry_path(self, name: str) -> str:
+        """智能体 ID 记录文件路径，按服务器地址区分，避免 cloud 与 local 互相覆盖"""
+        server = re.sub(r"[^\w.-]+", "_", self._base_url)
+        return os.path.join(AGENT_REGISTRY_DIR, server, f"{name}.json")
+    
+    def _load_agent_id(self, name: str) -> Optional[str]:
+        """读取本地记录的智能体 ID"""
+        try:
+            with open(self._registry_path(name), encoding="utf-8") as f:
+                return json.load(f).get("agent_id")
+        except (OSError, ValueError):
+            return None
+    
+    def _save_agent_id(self, name: str, agent_id: str) -> None:
+        """记录智能体 ID，供下次运行直接取回"""
+        path = self._registry_path(name)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"name": name, "base_url": self._base_url, "agent_id": agent_id}, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"保存智能体 ID 失败: {e}")
+    
+    @_requires_agent
     async def start_writing_project(self, project_name: str, project_type: str, 
                                  target_audience: str, requirements: str = "") -> None:
         """
@@ -107,9 +539,6 @@ class WritingAgent:
             target_audience: 目标读者
             requirements: 特殊要求
         """
-        if not self.agent:
-            raise ValueError("请先创建写作智能体")
-            
         project_info = f"""
 写作项目信息：
 - 项目名称：{project_name}
@@ -119,14 +548,18 @@ class WritingAgent:
 - 开始时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 """
         
-        # 更新项目记忆
-        await self._update_memory_block("current_project", project_info)
+        # 在后台更新项目记忆，不阻塞调用方；下一次发送消息前会等待写入完成
+        task = asyncio.create_task(self._update_memory_block("current_project", project_info))
+        self._pending_writes.append(task)
+        task.add_done_callback(self._pending_writes.remove)
         self.current_project = project_name
+        self._project_info = project_info
         
         print(f"📝 开始写作项目：{project_name}")
         print(f"项目类型：{project_type}")
         print(f"目标读者：{target_audience}")
     
+    @_requires_agent
     async def generate_outline(self, topic: str, structure_type: str = "standard") -> str:
         """
         生成文章大纲
@@ -138,33 +571,12 @@ class WritingAgent:
         Returns:
             生成的大纲
         """
-        if not self.agent:
-            raise ValueError("请先创建写作智能体")
-            
-        prompt = f"""
-请为以下主题生成详细的写作大纲：
-
-主题：{topic}
-结构类型：{structure_type}
-
-请提供：
-1. 文章标题建议
-2. 主要章节结构
-3. 每个章节的关键要点
-4. 逻辑流程说明
-5. 建议的写作顺序
-
-请确保大纲逻辑清晰，结构合理。
-"""
+        prompt = _OUTLINE_TMPL.substitute(topic=topic, structure_type=structure_type)
         
-        response = self.client.agents.messages.create(
-            agent_id=self.agent.id,
-            messages=[MessageCreate(role="user", content=prompt)]
+        outline = await self._send_message(
+            "generate_outline", prompt, query=topic, scope={"structure_type": structure_type},
+            title="📋 生成的文章大纲："
         )
-        
-        outline = response.messages[-1].content
-        print("📋 生成的文章大纲：")
-        print(outline)
         return outline
     
     async def expand_content(self, section: str, key_points: List[str], 
@@ -180,38 +592,69 @@ class WritingAgent:
         Returns:
             扩展后的内容
         """
-        if not self.agent:
-            raise ValueError("请先创建写作智能体")
-            
-        points_text = "\n".join([f"- {point}" for point in key_points])
-        
-        prompt = f"""
-请将以下章节内容扩展为完整的段落：
-
-章节：{section}
-关键要点：
-{points_text}
-
-要求：
-1. 字数控制在 {word_count} 字左右
-2. 保持逻辑清晰，过渡自然
-3. 使用具体的例子和细节
-4. 确保内容有深度和说服力
-5. 语言流畅，符合目标读者需求
-
-请直接输出扩展后的内容，不需要额外说明。
-"""
+        contents = await self.expand_sections([
+            {"section": section, "key_points": key_points, "word_count": word_count}
+        ])
+        return contents[0]
+    
+    @_requires_agent
+    async def expand_sections(self, items: List[Dict]) -> List[str]:
+        """
+        批量扩展多个章节，每批章节只发送一次请求
         
-        response = self.client.agents.messages.create(
-            agent_id=self.agent.id,
-            messages=[MessageCreate(role="user", content=prompt)]
+        Args:
+            items: 章节列表，每项包含 section、key_points 以及可选的 word_count（默认 500）
+            
+        Returns:
+            与 items 顺序一致的扩展内容列表
+        """
+        # 所有批次发往同一个智能体，必须依次发送，否则会互相覆盖消息历史
+        contents = []
+        for start in range(0, len(items), MAX_SECTIONS_PER_BATCH):
+            contents.extend(await self._expand_batch(items[start:start + MAX_SECTIONS_PER_BATCH]))
+        
+        for item, content in zip(items, contents):
+            print(f"📝 扩展内容（{item['section']}）：")
+            print(content)
+        return contents
+    
+    async def _expand_batch(self, batch: List[Dict]) -> List[str]:
+        """将一批章节打包到同一个提示词中扩展，并按分隔标记拆分回复"""
+        blocks = []
+        for i, item in enumerate(batch, 1):
+            points_text = "\n".join(f"- {point}" for point in item["key_points"])
+            blocks.append(_SECTION_TMPL.substitute(
+                index=i, section=item["section"], points=points_text,
+                word_count=item.get("word_count", 500)
+            ))
+        query = "".join(blocks)
+        prompt = _EXPAND_PREAMBLE + query
+        
+        indices = range(1, len(batch) + 1)
+        # 按批大小划分语义匹配范围，避免复用章节数不同的回复；缺少章节的回复不写入缓存
+        response = await self._send_message(
+            "expand_sections", prompt, query=query, scope={"batch_size": len(batch)},
+            validate=None if len(batch) == 1 else (
+                lambda text: all(_parse_sections(text).get(i) for i in indices)
+            )
         )
-        
-        content = response.messages[-1].content
-        print(f"📝 扩展内容（{section}）：")
-        print(content)
-        return content
+        sections = _parse_sections(response)
+        
+        if len(batch) == 1:
+            # 单个章节不要求分隔标记，模型未按格式返回时直接使用整段回复
+            content = sections.get(1) or response.strip()
+            if not content:
+                raise ValueError(f"扩展章节失败：{batch[0]['section']}")
+            return [content]
+            
+        missing = [i for i in indices if not sections.get(i)]
+        if missing:
+            print(f"⚠️ 回复中缺少第 {', '.join(map(str, missing))} 个章节，逐个重新扩展")
+            for i in missing:
+                sections[i] = (await self._expand_batch([batch[i - 1]]))[0]
+        return [sections[i] for i in indices]
     
+    @_requires_agent
     async def polish_content(self, content: str, focus_areas: List[str] = None) -> str:
         """
         润色内容
@@ -223,38 +666,27 @@ class WritingAgent:
         Returns:
             润色后的内容
         """
-        if not self.agent:
-            raise ValueError("请先创建写作智能体")
+        # 对本实例刚润色出的内容再次润色时直接返回；相同输入的重复调用由响应缓存处理
+        focus = tuple(focus_areas or ())
+        if self._memo_hit(self._polish_cache, (content, focus)):
+            print("✨ 润色后的内容：")
+            print(content)
+            return content
             
         focus_text = ""
         if focus_areas:
             focus_text = f"\n重点润色方面：{', '.join(focus_areas)}"
             
-        prompt = f"""
-请对以下内容进行润色改进：
-
-{content}
-
-润色要求：
-1. 改进语言表达，使其更加生动有力
-2. 优化句子结构，提高可读性
-3. 增强逻辑性和连贯性
-4. 确保用词准确，避免重复
-5. 保持原文的核心观点和结构{focus_text}
-
-请直接输出润色后的内容，并简要说明主要改进点。
-"""
+        prompt = _POLISH_TMPL.substitute(focus=focus_text, content=content)
         
-        response = self.client.agents.messages.create(
-            agent_id=self.agent.id,
-            messages=[MessageCreate(role="user", content=prompt)]
+        polished = await self._send_message(
+            "polish_content", prompt, query=content, scope={"focus_areas": focus_areas or []},
+            title="✨ 润色后的内容："
         )
-        
-        polished = response.messages[-1].content
-        print("✨ 润色后的内容：")
-        print(polished)
+        self._memo_add(self._polish_cache, (polished, focus))
         return polished
     
+    @_requires_agent
     async def adjust_style(self, content: str, target_style: str) -> str:
         """
         调整写作风格
@@ -266,34 +698,22 @@ class WritingAgent:
         Returns:
             调整后的内容
         """
-        if not self.agent:
-            raise ValueError("请先创建写作智能体")
+        # 内容是本实例刚调整出的目标风格结果时直接返回；相同输入的重复调用由响应缓存处理
+        if self._memo_hit(self._style_cache, (content, target_style)):
+            print(f"🎨 风格调整后的内容（{target_style}）：")
+            print(content)
+            return content
             
-        prompt = f"""
-请将以下内容调整为 {target_style} 的写作风格：
-
-{content}
-
-风格调整要求：
-1. 语言风格：{target_style}
-2. 保持原文的核心信息和逻辑结构
-3. 调整语调和表达方式以符合目标风格
-4. 确保风格转换自然，不显突兀
-5. 保持内容的专业性和准确性
-
-请直接输出调整后的内容。
-"""
+        prompt = _STYLE_TMPL.substitute(target_style=target_style, content=content)
         
-        response = self.client.agents.messages.create(
-            agent_id=self.agent.id,
-            messages=[MessageCreate(role="user", content=prompt)]
+        adjusted = await self._send_message(
+            "adjust_style", prompt, query=content, scope={"target_style": target_style},
+            title=f"🎨 风格调整后的内容（{target_style}）："
         )
-        
-        adjusted = response.messages[-1].content
-        print(f"🎨 风格调整后的内容（{target_style}）：")
-        print(adjusted)
+        self._memo_add(self._style_cache, (adjusted, target_style))
         return adjusted
     
+    @_requires_agent
     async def research_topic(self, topic: str, depth: str = "medium") -> str:
         """
         研究主题并收集信息
@@ -305,47 +725,119 @@ class WritingAgent:
         Returns:
             研究结果
         """
-        if not self.agent:
-            raise ValueError("请先创建写作智能体")
+        if depth not in _RESEARCH_PROMPTS:
+            raise ValueError(f"无效的研究深度: {depth}（可选：{', '.join(_RESEARCH_PROMPTS)}）")
             
-        depth_instructions = {
-            "shallow": "提供基础信息和概述",
-            "medium": "提供详细信息和多个角度",
-            "deep": "提供深入分析和专业见解"
-        }
+        prompt = _RESEARCH_PROMPTS[depth].substitute(topic=topic)
         
-        prompt = f"""
-请对以下主题进行 {depth_instructions[depth]} 的研究：
-
-主题：{topic}
-
-请提供：
-1. 主题的核心概念和定义
-2. 相关的重要事实和数据
-3. 不同观点和争议点
-4. 实际应用和案例
-5. 进一步研究的建议
-
-研究要求：{depth_instructions[depth]}，确保信息的准确性和相关性。
-"""
-        
-        response = self.client.agents.messages.create(
-            agent_id=self.agent.id,
-            messages=[MessageCreate(role="user", content=prompt)]
+        research = await self._send_message(
+            "research_topic", prompt, query=topic, scope={"depth": depth},
+            title=f"🔍 研究结果（{topic}）："
         )
-        
-        research = response.messages[-1].content
-        print(f"🔍 研究结果（{topic}）：")
-        print(research)
         return research
     
+    @staticmethod
+    def _memo_hit(memo: OrderedDict, key) -> bool:
+        """检查结果记录是否命中，命中时将其标记为最近使用"""
+        if key not in memo:
+            return False
+        memo.move_to_end(key)
+        return True
+    
+    @staticmethod
+    def _memo_add(memo: OrderedDict, key) -> None:
+        """记录一个结果，超出上限时淘汰最久未使用的条目"""
+        memo[key] = None
+        memo.move_to_end(key)
+        while len(memo) > MAX_MEMO_ENTRIES:
+            memo.popitem(last=False)
+    
+    async def _send_message(self, fn: str, prompt: str, query: str,
+                            scope: Optional[Dict] = None,
+                            title: Optional[str] = None,
+                            validate: Optional[Callable[[str], bool]] = None) -> str:
+        """
+        以流式方式发送消息给智能体并返回回复，命中缓存时跳过 LLM 调用
+        
+        Args:
+            fn: 调用方法名，用于区分缓存
+            prompt: 完整提示词
+            query: 提示词中随调用变化的部分，与 scope 一起决定缓存键，并用于语义匹配
+            scope: 离散参数（如研究深度），不同取值的响应互不复用
+            title: 输出标题，为 None 时不打印回复
+            validate: 校验回复的函数，返回 False 时不写入缓存
+            
+        Returns:
+            智能体最后一条回复的完整内容
+        """
+        # 回复依赖智能体自身的记忆，缓存按智能体隔离；--force-new 新建的智能体不会复用旧回复
+        cache_scope = self._cache.make_key(
+            fn=fn, agent_id=self.agent.id, model=self.model, style=self.writing_style, **(scope or {})
+        )
+        cache_key = self._cache.make_key(scope=cache_scope, query=query)
+        cached = await self._cache.get(cache_key, cache_scope, query)
+        if cached is not None:
+            if title is not None:
+                print(title)
+                print(cached)
+            return cached
+
+        try:
+            content = await self._stream_reply(prompt, title)
+        except BaseException:
+            self._cache.discard(cache_key)
+            raise
+            
+        # 空回复或调用方校验失败的回复不写入缓存，避免一次失败的调用被永久复用
+        if content and (validate is None or validate(content)):
+            await self._cache.put(cache_key, cache_scope, query, content)
+        else:
+            self._cache.discard(cache_key)
+        return content
+    
+    async def _stream_reply(self, prompt: str, title: Optional[str]) -> str:
+        """以流式方式发送一条消息，返回智能体最后一条回复的完整内容"""
+        # 先等待后台的记忆块写入完成，保证智能体看到的是最新的项目信息
+        await self.flush()
+        
+        # 同一智能体的请求串行发送；不同智能体之间并发，总数受信号量限制
+        async with _agent_lock(self.agent.id), _request_semaphore():
+            # 请求在锁内串行，逐字输出不会与本实例的其他回复交错
+            if title is not None:
+                print(title)
+                
+            buffer = io.StringIO()
+            message_id = None
+            try:
+                stream = self.client.agents.messages.create_stream(
+                    agent_id=self.agent.id,
+                    messages=[MessageCreate(role="user", content=prompt)],
+                    stream_tokens=True
+                )
+                async for chunk in stream:
+                    if getattr(chunk, "message_type", None) != "assistant_message":
+                        continue
+                    # 只保留最后一条助手消息
+                    if chunk.id != message_id:
+                        message_id = chunk.id
+                        buffer = io.StringIO()
+                    delta = chunk.content or ""
+                    buffer.write(delta)
+                    if title is not None:
+                        print(delta, end="", flush=True)
+            finally:
+                if title is not None:
+                    print()
+        
+        return buffer.getvalue()
+    
     async def _update_memory_block(self, block_label: str, new_value: str) -> None:
         """更新记忆块"""
         try:
             # 获取当前记忆块
             # block = self.client.agents.blocks.retrieve(self.agent.id, block_label=block_label)
             # 更新记忆块
-            self.client.agents.blocks.modify(
+            await self.client.agents.blocks.modify(
                 agent_id=self.agent.id,
                 block_label=block_label,
                 value=new_value,
@@ -359,37 +851,61 @@ class WritingAgent:
         if not self.agent:
             return {"error": "智能体未创建"}
             
-        try:
-            # 获取项目记忆
-            project_block = self.client.agents.blocks.retrieve(
-                self.agent.id, block_label="current_project"
-            )
+        # 项目信息由本实例写入，优先使用本地副本；复用已有智能体时才需要从服务器读取
+        if self._project_info is None:
+            try:
+                project_block = await self.client.agents.blocks.retrieve(
+                    self.agent.id, block_label="current_project"
+                )
+                self._project_info = project_block.value
+            except Exception as e:
+                return {"error": f"获取进度失败: {e}"}
             
-            return {
-                "current_project": project_block.value,
-                "agent_id": self.agent.id,
-                "agent_name": self.agent.name
-            }
-        except Exception as e:
-            return {"error": f"获取进度失败: {e}"}
+        return {
+            "current_project": self._project_info,
+            "agent_id": self.agent.id,
+            "agent_name": self.agent.name
+        }
 
 
-async def main():
-    """主函数 - 演示写作智能体的使用"""
-    print("🚀 启动写作智能体演示...")
+def _format_json(data) -> str:
+    """格式化 JSON 用于输出，优先使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+
+async def main(backend: Optional[str] = None, force_new: bool = False):
+    """
+    主函数 - 演示写作智能体的使用
     
-    # 创建写作智能体
-    # letta cloud
-    writer = WritingAgent(token="sk-let-ZjEwZDkzMmQtYzk3NC00YzFjLWFlZGItNWZkNDA1ZmQ1NTBkOmMxMGNkZGQ2LTllMTgtNGZmNC1hODk0LWMxNDA4MGYyMWE2NA==")
+    Args:
+        backend: 部署方式（cloud 或 local），默认根据是否设置 LETTA_API_KEY 决定
+        force_new: 为 True 时不复用已有智能体
+    """
+    print("🚀 启动写作智能体演示...")
     
-    # self-hosted 
-    # writer = WritingAgent(base_url = "http://localhost:8283")
+    # 创建写作智能体：cloud 使用 Letta Cloud（需要 LETTA_API_KEY），
+    # local 连接自托管服务器（LETTA_BASE_URL，默认 http://localhost:8283）
+    token = os.getenv("LETTA_API_KEY")
+    backend = backend or ("cloud" if token else "local")
+    if backend == "cloud":
+        if not token:
+            print("❌ 使用 Letta Cloud 需要设置 LETTA_API_KEY 环境变量")
+            return
+        writer = WritingAgent(token=token, backend=backend)
+    else:
+        writer = WritingAgent(
+            base_url=os.getenv("LETTA_BASE_URL", "http://localhost:8283"),
+            backend=backend
+        )
 
     try:
         # 创建智能体
         agent_id = await writer.create_writing_agent(
             name="writer_agent_v3",
-            style="专业、清晰、有逻辑性，适合学术和商业写作"
+            style="专业、清晰、有逻辑性，适合学术和商业写作",
+            force_new=force_new
         )
         
         # 开始写作项目
@@ -407,7 +923,7 @@ async def main():
             structure_type="business"
         )
         
-        # 研究主题
+        # 研究主题（与大纲使用同一个智能体，必须依次执行）
         print("\n" + "="*50)
         research = await writer.research_topic(
             topic="人工智能在商业中的应用",
@@ -445,13 +961,20 @@ async def main():
         print("\n" + "="*50)
         progress = await writer.get_writing_progress()
         print("📊 写作进度：")
-        print(json.dumps(progress, indent=2, ensure_ascii=False))
+        print(_format_json(progress))
         
     except Exception as e:
         print(f"❌ 错误: {e}")
+    finally:
+        await writer.flush()
+        await writer.aclose()
     
     print("\n✅ 写作智能体演示完成！")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="写作智能体演示")
+    parser.add_argument("--backend", choices=list(BACKEND_MODELS), help="部署方式：cloud 或 local")
+    parser.add_argument("--force-new", action="store_true", help="不复用已有的同名智能体，重新创建")
+    args = parser.parse_args()
+    asyncio.run(main(backend=args.backend, force_new=args.force_new))
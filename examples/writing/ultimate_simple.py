@@ -1,12 +1,45 @@
 #!/usr/bin/env python3
 
 
+import argparse
+import hashlib
+import json
 import os
+import tempfile
 from letta_client import CreateBlock, Letta, MessageCreate
 
+# 本地响应缓存文件（与 writer/writing_agent.py 格式一致）
+CACHE_PATH = ".letta_cache.json"
 
-def create_writer():
-    """创建写作智能体"""
+
+def _load_cache(path=CACHE_PATH):
+    """读取本地响应缓存"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(key, article, path=CACHE_PATH):
+    """写入一条缓存：合并进磁盘上的最新内容（保留 writing_agent.py 写入的条目），经临时文件原子替换"""
+    cache = _load_cache(path)
+    cache.setdefault("exact", {})[key] = article
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"写入缓存失败: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def create_writer(force_new=False):
+    """创建写作智能体（已存在同名智能体时直接复用，force_new=True 时总是重新创建）"""
     # 检查 DeepSeek API 密钥是否已设置
     if not os.getenv("DEEPSEEK_API_KEY"):
         print("❌ 未找到 DEEPSEEK_API_KEY 环境变量")
@@ -16,7 +49,7 @@ def create_writer():
         raise ValueError("需要设置 DEEPSEEK_API_KEY 环境变量")
     
     # 方式1：使用 Letta Cloud（需要 API 密钥）
-    # client = Letta(token="sk-let-ZjEwZDkzMmQtYzk3NC00YzFjLWFlZGItNWZkNDA1ZmQ1NTBkOmMxMGNkZGQ2LTllMTgtNGZmNC1hODk0LWMxNDA4MGYyMWE2NA==")
+    # client = Letta(token=os.getenv("LETTA_API_KEY"))
     # agent = client.agents.create(
     #     name="writer", 
     #     memory_blocks=[CreateBlock(label="persona", value="你是专业写作助手，使用 DeepSeek 模型")]
@@ -24,6 +57,10 @@ def create_writer():
     # 方式2：使用本地服务器（API 密钥在服务器启动时配置）
     client = Letta(base_url="http://localhost:8283")
     
+    if not force_new:
+        existing = client.agents.list(name="deepseek_writer", limit=1)
+        if existing:
+            return client, existing[0]
 
     agent = client.agents.create(
         name="deepseek_writer", 
@@ -33,15 +70,38 @@ def create_writer():
     )
     return client, agent
 
+def _assistant_text(response):
+    """从后往前查找最后一条助手消息的内容（回复中可能夹带工具调用等其他消息）"""
+    return next(
+        (m.content for m in reversed(response.messages) if getattr(m, "message_type", None) == "assistant_message"),
+        "",
+    )
+
+
 def write_article(client, agent, topic):
-    """写作 - 2 行代码！"""
+    """写作 - 2 行代码！（相同主题命中本地缓存时不再调用 LLM）"""
+    cache = _load_cache()
+    # 回复依赖智能体自身的记忆，缓存按智能体和模型隔离；--force-new 新建的智能体不会复用旧文章
+    params = {"fn": "write_article", "agent_id": agent.id, "model": agent.llm_config.handle, "topic": topic}
+    key = hashlib.sha256(json.dumps(params, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    if key in cache.get("exact", {}):
+        return cache["exact"][key]
+
     response = client.agents.messages.create(agent_id=agent.id, messages=[MessageCreate(role="user", content=f"写一篇关于 {topic} 的文章")])
-    return response.messages[-1].content if response.messages[-1].message_type == "assistant_message" else "写作完成"
+    article = _assistant_text(response)
+    if not article:
+        return "写作完成"
+    _save_cache(key, article)
+    return article
 
 # 🎯 使用示例 - 超简单！
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DeepSeek 写作智能体")
+    parser.add_argument("--force-new", action="store_true", help="不复用已有的同名智能体，重新创建")
+    args = parser.parse_args()
+
     # 创建智能体
-    client, agent = create_writer()
+    client, agent = create_writer(force_new=args.force_new)
     print("✅ DeepSeek 写作智能体创建成功！")
     
     # 开始写作